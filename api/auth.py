@@ -2,11 +2,21 @@
 Authentication endpoints and logic
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
+import jwt
+from jwt import InvalidTokenError
+from jwt.algorithms import get_default_algorithms
+from cachetools import TTLCache
+import base64
+import hashlib
+import hmac
+import itertools
+import json
 import logging
-import uuid
+import time
 
 from api.database import get_db
 from api.models import User
@@ -20,29 +30,68 @@ from api.utils import hash_password, verify_password, validate_password_strength
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Prepare the signing key once instead of re-parsing the secret per token
+_SIGNING_KEY = get_default_algorithms()[settings.algorithm].prepare_key(settings.secret_key)
+
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+# The JWT header is identical for every token, so serialize it once. For HMAC
+# algorithms also key the MAC once and copy it per token.
+_HEADER_SEGMENT = _b64url(json.dumps({"alg": settings.algorithm, "typ": "JWT"}, separators=(",", ":")).encode())
+_HMAC = (
+    hmac.new(_SIGNING_KEY, digestmod=_HMAC_DIGESTS[settings.algorithm])
+    if settings.algorithm in _HMAC_DIGESTS else None
+)
+
+# Recently verified payloads keyed on (token, expected_type)
+_TOKEN_CACHE = TTLCache(maxsize=10_000, ttl=60)
+
+# Per-process counter for log correlation ids
+_request_ids = itertools.count()
+
+# Upper bound on accepted token length; real tokens are a few hundred bytes
+MAX_TOKEN_LENGTH = 4096
+
+# Session tokens are valid for 30 days
+SESSION_EXPIRY_SECONDS = 30 * 24 * 60 * 60
+
+def _encode_token(claims: dict) -> str:
+    """Encode a JWT, signing only the payload segment per call for HMAC algorithms"""
+    if _HMAC is None:
+        return jwt.encode(claims, _SIGNING_KEY, algorithm=settings.algorithm)
+    
+    payload_segment = _b64url(json.dumps(claims, separators=(",", ":")).encode())
+    signing_input = _HEADER_SEGMENT + b"." + payload_segment
+    mac = _HMAC.copy()
+    mac.update(signing_input)
+    return (signing_input + b"." + _b64url(mac.digest())).decode()
+
 def create_magic_link_token(email: str) -> str:
     """Create a JWT token for magic link authentication"""
-    expire = datetime.utcnow() + timedelta(seconds=settings.magic_link_expiry_seconds)
+    expire = int(time.time()) + settings.magic_link_expiry_seconds
     to_encode = {
         "sub": email,
         "exp": expire,
         "type": "magic_link"
     }
-    token = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
-    logger.debug(f"Created magic link token for {email}, expires at {expire}")
+    token = _encode_token(to_encode)
+    logger.debug("Created magic link token for %s, expires at %s", email, expire)
     return token
 
 def create_session_token(user_id: str, email: str) -> str:
     """Create a JWT session token"""
-    expire = datetime.utcnow() + timedelta(days=30)
+    expire = int(time.time()) + SESSION_EXPIRY_SECONDS
     to_encode = {
         "sub": str(user_id),
         "email": email,
         "exp": expire,
         "type": "session"
     }
-    token = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
-    logger.debug(f"Created session token for user {user_id}, expires at {expire}")
+    token = _encode_token(to_encode)
+    logger.debug("Created session token for user %s, expires at %s", user_id, expire)
     return token
 
 @router.post("/signup", response_model=AuthResponse)
@@ -73,22 +122,22 @@ async def signup(
     **Errors:**
     - 400: Invalid password or user already exists
     """
-    request_id = str(uuid.uuid4())[:8]
-    logger.info(f"[{request_id}] Signup requested for {request.email}")
+    request_id = f"{next(_request_ids):08x}"
+    logger.info("[%s] Signup requested for %s", request_id, request.email)
     
     # Validate password strength
     is_valid, message = validate_password_strength(request.password)
     if not is_valid:
-        logger.warning(f"[{request_id}] Weak password for {request.email}: {message}")
+        logger.warning("[%s] Weak password for %s: %s", request_id, request.email, message)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=message
         )
     
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == request.email).first()
+    existing_user = db.execute(select(User).where(User.email == request.email)).scalar_one_or_none()
     if existing_user:
-        logger.warning(f"[{request_id}] User already exists: {request.email}")
+        logger.warning("[%s] User already exists: %s", request_id, request.email)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User with this email already exists"
@@ -103,9 +152,8 @@ async def signup(
     )
     db.add(user)
     db.commit()
-    db.refresh(user)
     
-    logger.info(f"[{request_id}] User created: {request.email} (user_id={user.id})")
+    logger.info("[%s] User created: %s (user_id=%s)", request_id, request.email, user.id)
     
     # Create session token
     session_token = create_session_token(user.id, user.email)
@@ -140,13 +188,13 @@ async def signin(
     **Errors:**
     - 401: Invalid email or password
     """
-    request_id = str(uuid.uuid4())[:8]
-    logger.info(f"[{request_id}] Signin requested for {request.email}")
+    request_id = f"{next(_request_ids):08x}"
+    logger.info("[%s] Signin requested for %s", request_id, request.email)
     
     # Find user
-    user = db.query(User).filter(User.email == request.email).first()
+    user = db.execute(select(User).where(User.email == request.email)).scalar_one_or_none()
     if not user:
-        logger.warning(f"[{request_id}] User not found: {request.email}")
+        logger.warning("[%s] User not found: %s", request_id, request.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
@@ -154,7 +202,7 @@ async def signin(
     
     # Check if user has password (might be social auth only)
     if not user.password_hash:
-        logger.warning(f"[{request_id}] User has no password: {request.email}")
+        logger.warning("[%s] User has no password: %s", request_id, request.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="This account uses social login. Please sign in with your social provider."
@@ -162,13 +210,13 @@ async def signin(
     
     # Verify password
     if not verify_password(request.password, user.password_hash):
-        logger.warning(f"[{request_id}] Invalid password for {request.email}")
+        logger.warning("[%s] Invalid password for %s", request_id, request.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
     
-    logger.info(f"[{request_id}] User authenticated: {request.email} (user_id={user.id})")
+    logger.info("[%s] User authenticated: %s (user_id=%s)", request_id, request.email, user.id)
     
     # Create session token
     session_token = create_session_token(user.id, user.email)
@@ -180,24 +228,44 @@ async def signin(
         auth_provider=user.auth_provider
     )
 
-def verify_token(token: str, expected_type: str) -> dict:
-    """Verify and decode a JWT token"""
+async def verify_token(token: str, expected_type: str) -> dict:
+    """Verify and decode a JWT token off the event loop"""
+    # Reject structurally invalid tokens before doing any decoding or crypto
+    if not token or len(token) > MAX_TOKEN_LENGTH or token.count(".") != 2:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token"
+        )
+    
+    cache_key = (token, expected_type)
+    payload = _TOKEN_CACHE.get(cache_key)
+    if payload is not None and payload.get("exp", float("inf")) > time.time():
+        return payload
+    
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        payload = await run_in_threadpool(
+            jwt.decode, token, _SIGNING_KEY, algorithms=[settings.algorithm]
+        )
         if payload.get("type") != expected_type:
-            logger.warning(f"Token type mismatch: expected {expected_type}, got {payload.get('type')}")
+            logger.warning("Token type mismatch: expected %s, got %s", expected_type, payload.get("type"))
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token type"
             )
+        _TOKEN_CACHE[cache_key] = payload
         return payload
-    except JWTError as e:
-        logger.warning(f"Token verification failed: {str(e)}")
+    except InvalidTokenError as e:
+        logger.warning("Token verification failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
         )
 
+def drop_cached_token(token: str) -> None:
+    """Evict a token from the verification cache (e.g. on logout)"""
+    for expected_type in ("magic_link", "session"):
+        _TOKEN_CACHE.pop((token, expected_type), None)
+
 @router.post("/request-magic-link", response_model=MagicLinkResponse)
 async def request_magic_link(
     request: MagicLinkRequest,
@@ -232,22 +300,27 @@ async def request_magic_link(
     ```
     """
     email = request.email
-    request_id = str(uuid.uuid4())[:8]
+    request_id = f"{next(_request_ids):08x}"
     
-    logger.info(f"[{request_id}] Magic link requested for {email}")
+    logger.info("[%s] Magic link requested for %s", request_id, email)
     
     # Create magic link token
     token = create_magic_link_token(email)
     
+    logger.info("[%s] Magic link generated for %s", request_id, email)
+    
     # In development, log the magic link to console
-    magic_link = f"http://localhost:8000/api/auth/verify?token={token}"
-    logger.info(f"[{request_id}] Magic link generated for {email}")
-    print(f"\n🔗 Magic Link for {email}:\n{magic_link}\n")
+    if settings.debug:
+        logger.info(
+            "[%s] 🔗 Magic Link for %s: http://localhost:8000/api/auth/verify?token=%s",
+            request_id, email, token
+        )
     
-    return MagicLinkResponse(
-        message=f"Magic link sent to {email}",
-        expires_in=settings.magic_link_expiry_seconds
-    )
+    # response_model validates this once; building the model here would validate twice
+    return {
+        "message": f"Magic link sent to {email}",
+        "expires_in": settings.magic_link_expiry_seconds
+    }
 
 @router.get("/verify", response_model=TokenVerifyResponse)
 async def verify_magic_link(
@@ -290,52 +363,60 @@ async def verify_magic_link(
     Authorization: Bearer <session_token>
     ```
     """
-    request_id = str(uuid.uuid4())[:8]
+    request_id = f"{next(_request_ids):08x}"
     
     # Verify the magic link token
-    payload = verify_token(token, "magic_link")
+    payload = await verify_token(token, "magic_link")
     email = payload.get("sub")
     
     if not email:
-        logger.error(f"[{request_id}] Token missing email subject")
+        logger.error("[%s] Token missing email subject", request_id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
     
-    logger.info(f"[{request_id}] Verifying magic link for {email}")
+    # Stored emails are lowercase, so match them with a plain indexed equality
+    email = email.lower()
     
-    # Find or create user
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        user = User(
-            email=email,
-            auth_provider="magic_link"
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        logger.info(f"[{request_id}] Created new user: {email} (user_id={user.id})")
+    logger.info("[%s] Verifying magic link for %s", request_id, email)
+    
+    # Find or create user in one round trip. The no-op update makes RETURNING
+    # yield the existing row on conflict; xmax = 0 only for freshly inserted rows.
+    stmt = (
+        pg_insert(User)
+        .values(email=email, auth_provider="magic_link")
+        .on_conflict_do_update(index_elements=[User.email], set_={"email": email})
+        .returning(User.id, User.email, literal_column("xmax = 0").label("created"))
+    )
+    user = db.execute(stmt).one()
+    db.commit()
+    
+    if user.created:
+        logger.info("[%s] Created new user: %s (user_id=%s)", request_id, email, user.id)
     else:
-        logger.info(f"[{request_id}] User authenticated: {email} (user_id={user.id})")
+        logger.info("[%s] User authenticated: %s (user_id=%s)", request_id, email, user.id)
     
     # Create session token
     session_token = create_session_token(user.id, user.email)
     
-    return TokenVerifyResponse(
-        user_id=user.id,
-        email=user.email,
-        session_token=session_token
-    )
+    return {
+        "user_id": user.id,
+        "email": user.email,
+        "session_token": session_token
+    }
+
+def _load_user(db: Session, user_id: str) -> User:
+    return db.execute(select(User).where(User.id == user_id)).scalar_one_or_none()
 
-def get_current_user(
+async def get_current_user(
     token: str,
     db: Session = Depends(get_db)
 ) -> User:
     """
     Dependency to get current authenticated user from session token.
     """
-    payload = verify_token(token, "session")
+    payload = await verify_token(token, "session")
     user_id = payload.get("sub")
     
     if not user_id:
@@ -345,9 +426,10 @@ def get_current_user(
             detail="Invalid session token"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    # The lookup is a blocking driver call; keep it off the event loop
+    user = await run_in_threadpool(_load_user, db, user_id)
     if not user:
-        logger.error(f"User not found for ID: {user_id}")
+        logger.error("User not found for ID: %s", user_id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
@@ -355,7 +437,7 @@ def get_current_user(
     
     return user
 
-def get_current_user_from_header(
+async def get_current_user_from_header(
     authorization: str = Header(None),
     db: Session = Depends(get_db)
 ) -> User:
@@ -375,6 +457,6 @@ def get_current_user_from_header(
         )
     
     token = authorization.replace("Bearer ", "")
-    return get_current_user(token, db)
+    return await get_current_user(token, db)
 
 
@@ -7,11 +7,18 @@ from sqlalchemy.orm import sessionmaker
 
 from api.config import settings
 
-# Create database engine
-engine = create_engine(settings.database_url)
+# Create database engine with a pooled set of connections reused across requests
+engine = create_engine(
+    settings.database_url,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_pre_ping=True,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    query_cache_size=1200,
+)
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create session factory; objects stay usable after commit without a reload
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Base class for models
 Base = declarative_base()
@@ -16,6 +16,23 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def split_statements(sql: str) -> list:
+    """Split a migration on semicolons, keeping dollar-quoted blocks (DO $$ ... $$) whole"""
+    statements = []
+    current = []
+    for i, chunk in enumerate(sql.split("$$")):
+        if i % 2:
+            # Inside a dollar-quoted body; its semicolons belong to the block
+            current.append(f"$${chunk}$$")
+            continue
+        parts = chunk.split(";")
+        current.append(parts[0])
+        for part in parts[1:]:
+            statements.append("".join(current).strip())
+            current = [part]
+    statements.append("".join(current).strip())
+    return [s for s in statements if s]
+
 def run_migration(migration_file: str):
     """Run a SQL migration file"""
     engine = create_engine(settings.database_url)
@@ -40,7 +57,7 @@ def run_migration(migration_file: str):
     try:
         with engine.connect() as conn:
             # Split by semicolon and execute each statement
-            statements = [s.strip() for s in sql.split(';') if s.strip()]
+            statements = split_statements(sql)
             for i, statement in enumerate(statements, 1):
                 logger.info(f"Executing statement {i}/{len(statements)}: {statement[:80]}...")
                 conn.execute(text(statement))
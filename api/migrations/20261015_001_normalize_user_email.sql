@@ -0,0 +1,9 @@
+-- Migration: Normalize user emails to lowercase
+-- Date: 2026-10-15
+-- Description: Store emails lowercase so auth lookups stay a plain indexed equality, and enforce case-insensitive uniqueness
+
+-- Lowercase existing emails (accounts that differ only by case must be merged first)
+UPDATE users SET email = LOWER(email) WHERE email <> LOWER(email);
+
+-- Enforce case-insensitive uniqueness
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_lower ON users (LOWER(email));
@@ -0,0 +1,9 @@
+-- Migration: Add composite indexes for insight queries
+-- Date: 2026-10-15
+-- Description: Cover "price of product X at store Y over time" and per-receipt line item reads with a single index each
+
+-- Price history lookups filter on product and store, then range over date
+CREATE INDEX IF NOT EXISTS ix_price_history_product_store_date ON price_history (product_name, store_id, observed_date);
+
+-- Line items are read per receipt in line order
+CREATE INDEX IF NOT EXISTS ix_line_items_receipt_line ON line_items (receipt_id, line_number);
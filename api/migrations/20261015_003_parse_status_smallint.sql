@@ -0,0 +1,30 @@
+-- Migration: Store receipt parse status as a small integer
+-- Date: 2026-10-15
+-- Description: Replace the parsestatus enum column with SMALLINT codes (0=pending, 1=success, 2=failed, 3=needs_review) and index it
+
+-- Convert existing values (SQLAlchemy stored enum member names), skipped once the column is already SMALLINT
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'receipts'
+          AND column_name = 'parse_status'
+          AND data_type <> 'smallint'
+    ) THEN
+        ALTER TABLE receipts ALTER COLUMN parse_status TYPE SMALLINT USING (
+            CASE parse_status::text
+                WHEN 'PENDING' THEN 0
+                WHEN 'SUCCESS' THEN 1
+                WHEN 'FAILED' THEN 2
+                WHEN 'NEEDS_REVIEW' THEN 3
+            END
+        );
+    END IF;
+END $$;
+
+-- The named enum type is no longer referenced
+DROP TYPE IF EXISTS parsestatus;
+
+-- Insight aggregations filter on parse status
+CREATE INDEX IF NOT EXISTS ix_receipts_parse_status ON receipts (parse_status);
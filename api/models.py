@@ -1,12 +1,13 @@
 """
 SQLAlchemy ORM models for Nimbly
 """
-import uuid
 from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Integer, Enum, Date, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Integer, SmallInteger, Date, Text, Index, func
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
+from uuid6 import uuid7
 import enum
 
 from api.database import Base
@@ -17,10 +18,29 @@ class ParseStatus(str, enum.Enum):
     FAILED = "failed"
     NEEDS_REVIEW = "needs_review"
 
+class ParseStatusType(TypeDecorator):
+    """Stores ParseStatus as a SMALLINT code instead of a named Postgres enum"""
+    impl = SmallInteger
+    cache_ok = True
+    
+    CODES = {
+        ParseStatus.PENDING: 0,
+        ParseStatus.SUCCESS: 1,
+        ParseStatus.FAILED: 2,
+        ParseStatus.NEEDS_REVIEW: 3,
+    }
+    STATUSES = {code: parse_status for parse_status, code in CODES.items()}
+    
+    def process_bind_param(self, value, dialect):
+        return None if value is None else self.CODES[ParseStatus(value)]
+    
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.STATUSES[value]
+
 class User(Base):
     __tablename__ = "users"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     email = Column(String, unique=True, nullable=False, index=True)
     password_hash = Column(String, nullable=True)  # For email/password auth
     auth_provider = Column(String, default="email", nullable=False)  # email, google, apple, meta, magic_link
@@ -30,11 +50,16 @@ class User(Base):
     
     # Relationships
     receipts = relationship("Receipt", back_populates="user", cascade="all, delete-orphan")
+    
+    # Emails are stored lowercase; enforce case-insensitive uniqueness as well
+    __table_args__ = (
+        Index("idx_users_email_lower", func.lower(email), unique=True),
+    )
 
 class Store(Base):
     __tablename__ = "stores"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     name = Column(String, nullable=False)
     normalized_name = Column(String, unique=True, nullable=False, index=True)
     address = Column(String, nullable=True)
@@ -48,14 +73,14 @@ class Store(Base):
 class Receipt(Base):
     __tablename__ = "receipts"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
     store_id = Column(UUID(as_uuid=True), ForeignKey("stores.id"), nullable=True, index=True)
     upload_timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     purchase_date = Column(Date, nullable=True, index=True)
     total_amount = Column(Numeric(10, 2), nullable=True)
     original_file_path = Column(String, nullable=False)
-    parse_status = Column(Enum(ParseStatus), default=ParseStatus.PENDING, nullable=False)
+    parse_status = Column(ParseStatusType, default=ParseStatus.PENDING, nullable=False, index=True)
     parse_error = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -68,7 +93,7 @@ class Receipt(Base):
 class LineItem(Base):
     __tablename__ = "line_items"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     receipt_id = Column(UUID(as_uuid=True), ForeignKey("receipts.id"), nullable=False, index=True)
     product_name = Column(String, nullable=False)
     normalized_product_name = Column(String, nullable=False, index=True)
@@ -80,11 +105,16 @@ class LineItem(Base):
     
     # Relationships
     receipt = relationship("Receipt", back_populates="line_items")
+    
+    # Composite index for reading a receipt's items in line order
+    __table_args__ = (
+        Index("ix_line_items_receipt_line", "receipt_id", "line_number"),
+    )
 
 class PriceHistory(Base):
     __tablename__ = "price_history"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     product_name = Column(String, nullable=False, index=True)
     store_id = Column(UUID(as_uuid=True), ForeignKey("stores.id"), nullable=False, index=True)
     price = Column(Numeric(10, 2), nullable=False)
@@ -98,5 +128,6 @@ class PriceHistory(Base):
     
     # Composite indexes for efficient queries
     __table_args__ = (
+        Index("ix_price_history_product_store_date", "product_name", "store_id", "observed_date"),
         {'extend_existing': True}
     )
@@ -2,7 +2,7 @@
 Receipt upload and retrieval endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Header, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import Optional
 import uuid
 import os
@@ -102,7 +102,6 @@ async def upload_receipt(
         )
         db.add(receipt)
         db.commit()
-        db.refresh(receipt)
         
         logger.info(f"[{request_id}] Receipt record created: receipt_id={receipt.id}")
         
@@ -155,7 +154,13 @@ async def list_receipts(
     query = db.query(Receipt).filter(Receipt.user_id == user.id)
     total = query.count()
     
-    receipts = query.order_by(Receipt.upload_timestamp.desc()).offset(offset).limit(limit).all()
+    receipts = (
+        query.options(joinedload(Receipt.store))
+        .order_by(Receipt.upload_timestamp.desc())
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
     
     logger.info(f"[{request_id}] Found {len(receipts)} receipts (total={total})")
     
@@ -198,8 +203,11 @@ async def get_receipt_detail(
     
     logger.info(f"[{request_id}] Fetching receipt detail: user={user.id}, receipt={receipt_id}")
     
-    # Query receipt
-    receipt = db.query(Receipt).filter(
+    # Query receipt with its store and line items in one round-trip
+    receipt = db.query(Receipt).options(
+        joinedload(Receipt.store),
+        joinedload(Receipt.line_items)
+    ).filter(
         Receipt.id == receipt_id,
         Receipt.user_id == user.id
     ).first()
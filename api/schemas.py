@@ -3,19 +3,22 @@ Pydantic schemas for request/response validation
 """
 from __future__ import annotations
 
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from pydantic import AfterValidator, BaseModel, EmailStr, Field
+from typing import Annotated, Optional, List
 from datetime import datetime, date
 from decimal import Decimal
 from uuid import UUID
 
+# Emails are stored lowercase so user lookups stay a plain indexed equality
+NormalizedEmail = Annotated[EmailStr, AfterValidator(str.lower)]
+
 # Auth schemas
 class SignUpRequest(BaseModel):
-    email: EmailStr
+    email: NormalizedEmail
     password: str = Field(..., min_length=8)
 
 class SignInRequest(BaseModel):
-    email: EmailStr
+    email: NormalizedEmail
     password: str
 
 class AuthResponse(BaseModel):
@@ -25,7 +28,7 @@ class AuthResponse(BaseModel):
     auth_provider: str
 
 class MagicLinkRequest(BaseModel):
-    email: EmailStr
+    email: NormalizedEmail
 
 class MagicLinkResponse(BaseModel):
     message: str
@@ -1,11 +1,18 @@
 """
 Pytest configuration and fixtures
 """
+import httpx
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import pytest_asyncio
+from hypothesis import Phase, settings as hypothesis_settings
+from hypothesis.database import DirectoryBasedExampleDatabase
+from contextlib import contextmanager
+from types import SimpleNamespace
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker
 from fastapi.testclient import TestClient
 
+from api.auth import create_session_token
 from api.database import Base, get_db
 from api.main import app
 
@@ -16,33 +23,214 @@ TEST_DATABASE_URL = os.getenv(
     "postgresql://nimbly:nimbly@db:5432/nimbly_test"
 )
 
-@pytest.fixture(scope="function")
-def db_engine():
-    """Create a test database engine"""
+# Hypothesis profiles, picked with HYPOTHESIS_PROFILE:
+# - ci: deterministic inputs, so every run checks the same examples
+# - dev: random inputs, with failing examples saved and replayed first
+# - fast: only the explicit @example cases
+hypothesis_settings.register_profile(
+    "ci",
+    max_examples=200,
+    deadline=5000,
+    derandomize=True,
+    phases=[Phase.explicit, Phase.generate, Phase.shrink]
+)
+hypothesis_settings.register_profile(
+    "dev",
+    max_examples=10,
+    deadline=None,
+    database=DirectoryBasedExampleDatabase(".hypothesis/examples"),
+    phases=[Phase.explicit, Phase.reuse, Phase.generate, Phase.shrink]
+)
+hypothesis_settings.register_profile("fast", phases=[Phase.explicit])
+hypothesis_settings.load_profile(os.getenv("HYPOTHESIS_PROFILE", "dev"))
+
+def _worker_schema(config):
+    """Postgres schema for this pytest-xdist worker, or None when not distributed"""
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput is None:
+        return None
+    return f"test_{workerinput['workerid']}"
+
+@pytest.fixture(scope="session")
+def db_engine(request):
+    """
+    Create a test database engine and schema once per test session.
+
+    Under pytest-xdist each worker gets its own Postgres schema, so workers
+    seed, commit and roll back without contending for the same rows.
+    Connections run with synchronous_commit off and the tables are created
+    UNLOGGED, since nothing here needs to survive a crash.
+    """
     engine = create_engine(TEST_DATABASE_URL)
+    schema = _worker_schema(request.config)
+
+    @event.listens_for(engine, "connect", insert=True)
+    def configure_connection(dbapi_connection, connection_record):
+        # Run outside a transaction so the settings survive pool rollbacks
+        existing_autocommit = dbapi_connection.autocommit
+        dbapi_connection.autocommit = True
+        cursor = dbapi_connection.cursor()
+        # Test data is disposable; don't wait for the WAL flush on every commit
+        cursor.execute("SET SESSION synchronous_commit TO OFF")
+        if schema:
+            cursor.execute(f"SET SESSION search_path TO {schema}")
+        cursor.close()
+        dbapi_connection.autocommit = existing_autocommit
+
+    if schema:
+        with engine.begin() as connection:
+            connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        # Children first: a logged table can't reference an unlogged one
+        for table in reversed(Base.metadata.sorted_tables):
+            table_name = engine.dialect.identifier_preparer.format_table(table)
+            connection.execute(text(f"ALTER TABLE {table_name} SET UNLOGGED"))
     yield engine
     Base.metadata.drop_all(bind=engine)
+    if schema:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
     engine.dispose()
 
 @pytest.fixture(scope="function")
 def db_session(db_engine):
-    """Create a test database session"""
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
-    session = TestingSessionLocal()
+    """
+    Create a test database session joined to an outer transaction.
+
+    Commits issued by tests or endpoints only release a SAVEPOINT; the outer
+    transaction is rolled back on teardown so no test sees another's rows.
+    Like SessionLocal, objects are not expired on commit.
+    """
+    connection = db_engine.connect()
+    transaction = connection.begin()
+    session = Session(
+        bind=connection,
+        autoflush=False,
+        expire_on_commit=False,
+        join_transaction_mode="create_savepoint"
+    )
     yield session
     session.close()
+    transaction.rollback()
+    connection.close()
 
 @pytest.fixture(scope="function")
-def client(db_session):
-    """Create a test client with database session override"""
+def example_savepoint(db_session):
+    """
+    Isolate Hypothesis examples, which all share one db_session.
+
+    Returns a context manager that runs the example inside a SAVEPOINT and
+    rolls it back afterwards; examples flush instead of committing.
+    """
+    @contextmanager
+    def _example():
+        savepoint = db_session.begin_nested()
+        try:
+            yield db_session
+        finally:
+            savepoint.rollback()
+
+    return _example
+
+@pytest.fixture(scope="module")
+def committed_session(db_engine):
+    """
+    Session for module-scoped seed data that API calls must see committed.
+
+    Those rows outlive each test's rollback, so every table is truncated once
+    the module finishes.
+    """
+    session = Session(bind=db_engine, expire_on_commit=False)
+    yield session
+    session.close()
+
+    preparer = db_engine.dialect.identifier_preparer
+    tables = ", ".join(preparer.format_table(table) for table in Base.metadata.sorted_tables)
+    with db_engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+
+@pytest.fixture(scope="session")
+def test_db_override(db_engine):
+    """
+    Route get_db to the test database for the whole session.
+
+    By default each request gets its own session on the test engine, so
+    module- and session-scoped fixtures can call the API without a db_session.
+    """
+    TestingSessionLocal = sessionmaker(bind=db_engine, autoflush=False, expire_on_commit=False)
+
+    def override_get_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield
+    app.dependency_overrides.clear()
+
+@contextmanager
+def _db_session_override(db_session):
+    """Serve requests from db_session, then restore the session-wide override"""
     def override_get_db():
         try:
             yield db_session
         finally:
             pass
-    
+
+    session_override = app.dependency_overrides[get_db]
     app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield
+    finally:
+        app.dependency_overrides[get_db] = session_override
+
+@pytest.fixture(scope="session")
+def app_client(test_db_override):
+    """Create a single test client for the whole session"""
     with TestClient(app) as test_client:
         yield test_client
-    app.dependency_overrides.clear()
+
+@pytest.fixture(scope="function")
+def client(app_client, db_session):
+    """Point the shared test client at this test's database session"""
+    with _db_session_override(db_session):
+        yield app_client
+
+@pytest_asyncio.fixture(scope="session")
+async def async_app_client(test_db_override):
+    """Create a single async client that calls the app in-process over ASGI"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as async_client:
+        yield async_client
+
+@pytest.fixture(scope="function")
+def aclient(async_app_client, db_session):
+    """Point the shared async client at this test's database session"""
+    with _db_session_override(db_session):
+        yield async_app_client
+
+@pytest.fixture(scope="session")
+def make_session_token():
+    """
+    Return a factory that signs one session token per (user_id, email).
+
+    Each call returns a namespace with the token and a prebuilt
+    Authorization header mapping.
+    """
+    cache = {}
+
+    def _make(user_id, email):
+        key = (str(user_id), email)
+        if key not in cache:
+            token = create_session_token(*key)
+            cache[key] = SimpleNamespace(
+                token=token,
+                headers={"Authorization": f"Bearer {token}"}
+            )
+        return cache[key]
+
+    return _make
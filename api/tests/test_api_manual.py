@@ -1,13 +1,19 @@
 """
 Comprehensive API testing script for Nimbly
 Tests all endpoints as per task 18
+
+Probes are independent, so they run concurrently against the live server.
+Run directly (python api/tests/test_api_manual.py); pytest does not collect it.
 """
-import requests
-import json
-from pathlib import Path
+import asyncio
+
+import httpx
 
 BASE_URL = "http://localhost:8000"
 
+# Manual script against a running server, not a pytest module
+__test__ = False
+
 def print_test(name, passed, details=""):
     status = "✓ PASS" if passed else "✗ FAIL"
     print(f"{status} - {name}")
@@ -15,148 +21,131 @@ def print_test(name, passed, details=""):
         print(f"  {details}")
     print()
 
-def test_root():
+def response_body(response):
+    """Decode JSON bodies, fall back to text for everything else"""
+    if response.headers.get('content-type') == 'application/json':
+        return response.json()
+    return response.text
+
+async def test_root(client):
     """Test root endpoint"""
     try:
-        response = requests.get(f"{BASE_URL}/")
+        response = await client.get("/")
         passed = response.status_code == 200 and "Nimbly API" in response.text
-        print_test("Root endpoint", passed, f"Status: {response.status_code}, Response: {response.json()}")
-        return passed
+        return "Root endpoint", passed, f"Status: {response.status_code}, Response: {response.json()}"
     except Exception as e:
-        print_test("Root endpoint", False, f"Error: {e}")
-        return False
+        return "Root endpoint", False, f"Error: {e}"
 
-def test_health():
+async def test_health(client):
     """Test health endpoint"""
     try:
-        response = requests.get(f"{BASE_URL}/health")
+        response = await client.get("/health")
         data = response.json()
         passed = response.status_code == 200 and data.get("status") == "healthy"
-        print_test("Health endpoint", passed, f"Status: {response.status_code}, Response: {data}")
-        return passed
+        return "Health endpoint", passed, f"Status: {response.status_code}, Response: {data}"
     except Exception as e:
-        print_test("Health endpoint", False, f"Error: {e}")
-        return False
+        return "Health endpoint", False, f"Error: {e}"
 
-def test_docs():
+async def test_docs(client):
     """Test OpenAPI docs endpoint"""
     try:
-        response = requests.get(f"{BASE_URL}/docs")
+        response = await client.get("/docs")
         passed = response.status_code == 200 and "swagger" in response.text.lower()
-        print_test("OpenAPI docs", passed, f"Status: {response.status_code}")
-        return passed
+        return "OpenAPI docs", passed, f"Status: {response.status_code}"
     except Exception as e:
-        print_test("OpenAPI docs", False, f"Error: {e}")
-        return False
+        return "OpenAPI docs", False, f"Error: {e}"
 
-def test_magic_link_request():
+async def test_magic_link_request(client):
     """Test magic link request"""
     try:
-        response = requests.post(
-            f"{BASE_URL}/api/auth/request-magic-link",
+        response = await client.post(
+            "/api/auth/request-magic-link",
             json={"email": "test@example.com"}
         )
         data = response.json()
         passed = response.status_code == 200 and "message" in data
-        print_test("Magic link request", passed, f"Status: {response.status_code}, Response: {data}")
-        return passed
+        return "Magic link request", passed, f"Status: {response.status_code}, Response: {data}"
     except Exception as e:
-        print_test("Magic link request", False, f"Error: {e}")
-        return False
+        return "Magic link request", False, f"Error: {e}"
 
-def test_magic_link_invalid_email():
+async def test_magic_link_invalid_email(client):
     """Test magic link with invalid email"""
     try:
-        response = requests.post(
-            f"{BASE_URL}/api/auth/request-magic-link",
+        response = await client.post(
+            "/api/auth/request-magic-link",
             json={"email": "invalid-email"}
         )
         # Accept either 400 or 422 as both indicate validation error
         passed = response.status_code in [400, 422]
-        print_test("Magic link invalid email", passed, f"Status: {response.status_code}")
-        return passed
+        return "Magic link invalid email", passed, f"Status: {response.status_code}"
     except Exception as e:
-        print_test("Magic link invalid email", False, f"Error: {e}")
-        return False
+        return "Magic link invalid email", False, f"Error: {e}"
 
-def test_receipt_upload_no_auth():
+async def test_receipt_upload_no_auth(client):
     """Test receipt upload without authentication"""
     try:
         # Create a dummy file to send
         files = {'file': ('test.txt', 'test content', 'text/plain')}
-        response = requests.post(f"{BASE_URL}/api/receipts/upload", files=files)
-        data = response.json() if response.headers.get('content-type') == 'application/json' else response.text
+        response = await client.post("/api/receipts/upload", files=files)
         passed = response.status_code == 401  # Unauthorized
-        print_test("Receipt upload (no auth)", passed, f"Status: {response.status_code}, Response: {data}")
-        return passed
+        return "Receipt upload (no auth)", passed, f"Status: {response.status_code}, Response: {response_body(response)}"
     except Exception as e:
-        print_test("Receipt upload (no auth)", False, f"Error: {e}")
-        return False
+        return "Receipt upload (no auth)", False, f"Error: {e}"
 
-def test_receipts_list_no_auth():
+async def test_receipts_list_no_auth(client):
     """Test receipts list without authentication"""
     try:
-        response = requests.get(f"{BASE_URL}/api/receipts")
-        data = response.json() if response.headers.get('content-type') == 'application/json' else response.text
+        response = await client.get("/api/receipts")
         passed = response.status_code == 401  # Unauthorized
-        print_test("Receipts list (no auth)", passed, f"Status: {response.status_code}, Response: {data}")
-        return passed
+        return "Receipts list (no auth)", passed, f"Status: {response.status_code}, Response: {response_body(response)}"
     except Exception as e:
-        print_test("Receipts list (no auth)", False, f"Error: {e}")
-        return False
+        return "Receipts list (no auth)", False, f"Error: {e}"
 
-def test_insights_no_auth():
+async def test_insights_no_auth(client):
     """Test insights without authentication"""
     try:
-        response = requests.get(f"{BASE_URL}/api/insights")
-        data = response.json() if response.headers.get('content-type') == 'application/json' else response.text
+        response = await client.get("/api/insights")
         passed = response.status_code == 401  # Unauthorized
-        print_test("Insights (no auth)", passed, f"Status: {response.status_code}, Response: {data}")
-        return passed
+        return "Insights (no auth)", passed, f"Status: {response.status_code}, Response: {response_body(response)}"
     except Exception as e:
-        print_test("Insights (no auth)", False, f"Error: {e}")
-        return False
+        return "Insights (no auth)", False, f"Error: {e}"
 
-def test_invalid_endpoint():
+async def test_invalid_endpoint(client):
     """Test invalid endpoint returns 404"""
     try:
-        response = requests.get(f"{BASE_URL}/invalid-endpoint")
+        response = await client.get("/invalid-endpoint")
         passed = response.status_code == 404
-        print_test("Invalid endpoint", passed, f"Status: {response.status_code}")
-        return passed
+        return "Invalid endpoint", passed, f"Status: {response.status_code}"
     except Exception as e:
-        print_test("Invalid endpoint", False, f"Error: {e}")
-        return False
+        return "Invalid endpoint", False, f"Error: {e}"
+
+SECTIONS = [
+    ("PUBLIC ENDPOINTS", [test_root, test_health, test_docs]),
+    ("AUTH ENDPOINTS", [test_magic_link_request, test_magic_link_invalid_email]),
+    ("PROTECTED ENDPOINTS (No Auth)", [test_receipt_upload_no_auth, test_receipts_list_no_auth, test_insights_no_auth]),
+    ("ERROR HANDLING", [test_invalid_endpoint]),
+]
 
-def main():
+async def main():
     print("=" * 60)
     print("NIMBLY API COMPREHENSIVE TEST SUITE")
     print("=" * 60)
     print()
-    
+
+    # Fire every probe at once, then report them grouped by section
+    async with httpx.AsyncClient(base_url=BASE_URL) as client:
+        outcomes = await asyncio.gather(*(
+            asyncio.gather(*(probe(client) for probe in probes))
+            for _, probes in SECTIONS
+        ))
+
     results = []
-    
-    # Public endpoints
-    print("--- PUBLIC ENDPOINTS ---")
-    results.append(test_root())
-    results.append(test_health())
-    results.append(test_docs())
-    
-    # Auth endpoints
-    print("--- AUTH ENDPOINTS ---")
-    results.append(test_magic_link_request())
-    results.append(test_magic_link_invalid_email())
-    
-    # Protected endpoints (should fail without auth)
-    print("--- PROTECTED ENDPOINTS (No Auth) ---")
-    results.append(test_receipt_upload_no_auth())
-    results.append(test_receipts_list_no_auth())
-    results.append(test_insights_no_auth())
-    
-    # Error handling
-    print("--- ERROR HANDLING ---")
-    results.append(test_invalid_endpoint())
-    
+    for (section, _), section_outcomes in zip(SECTIONS, outcomes):
+        print(f"--- {section} ---")
+        for name, passed, details in section_outcomes:
+            print_test(name, passed, details)
+            results.append(passed)
+
     # Summary
     print("=" * 60)
     print("SUMMARY")
@@ -165,7 +154,7 @@ def main():
     total = len(results)
     print(f"Tests passed: {passed}/{total}")
     print(f"Success rate: {(passed/total)*100:.1f}%")
-    
+
     if passed == total:
         print("\n🎉 All tests passed!")
         return 0
@@ -174,4 +163,4 @@ def main():
         return 1
 
 if __name__ == "__main__":
-    exit(main())
+    exit(asyncio.run(main()))
@@ -2,11 +2,23 @@
 Integration tests for authentication endpoints
 """
 import pytest
+import time
 from datetime import datetime, timedelta
-from jose import jwt
+import jwt
 
+from fastapi import HTTPException
+
+from api import auth
+from api.auth import (
+    SESSION_EXPIRY_SECONDS,
+    _encode_token,
+    create_magic_link_token,
+    drop_cached_token,
+    verify_token
+)
 from api.config import settings
 from api.models import User
+from api.utils import hash_password
 
 
 def test_magic_link_request(client):
@@ -115,7 +127,7 @@ def test_session_token_authentication(client, db_session):
     db_session.commit()
     
     # Create session token
-    expire = datetime.utcnow() + timedelta(days=30)
+    expire = datetime.utcnow() + timedelta(seconds=SESSION_EXPIRY_SECONDS)
     session_token = jwt.encode(
         {"sub": str(user.id), "email": email, "exp": expire, "type": "session"},
         settings.secret_key,
@@ -146,3 +158,150 @@ def test_invalid_authorization_format(client):
     )
     
     assert response.status_code == 401
+
+
+def test_signup_lowercases_email(client, db_session):
+    """Test that signing up with a mixed-case email stores it lowercase"""
+    response = client.post(
+        "/api/auth/signup",
+        json={"email": "Mixed@Example.COM", "password": "Passw0rdOK"}
+    )
+    
+    assert response.status_code == 200
+    assert response.json()["email"] == "mixed@example.com"
+    
+    user = db_session.query(User).filter(User.email == "mixed@example.com").first()
+    assert user is not None
+    assert str(user.id) == response.json()["user_id"]
+
+
+def test_signin_matches_email_case_insensitively(client, db_session):
+    """Test that signing in with a mixed-case email finds the lowercase user"""
+    user = User(email="mixed@example.com", password_hash=hash_password("Passw0rdOK"), auth_provider="email")
+    db_session.add(user)
+    db_session.commit()
+    
+    response = client.post(
+        "/api/auth/signin",
+        json={"email": "Mixed@Example.COM", "password": "Passw0rdOK"}
+    )
+    
+    assert response.status_code == 200
+    assert response.json()["user_id"] == str(user.id)
+    assert response.json()["email"] == "mixed@example.com"
+
+
+def test_magic_link_request_lowercases_email(client):
+    """Test that a magic link requested for a mixed-case email targets the lowercase address"""
+    response = client.post(
+        "/api/auth/request-magic-link",
+        json={"email": "Mixed@Example.COM"}
+    )
+    
+    assert response.status_code == 200
+    assert response.json()["message"] == "Magic link sent to mixed@example.com"
+
+
+def test_magic_link_verify_mixed_case_finds_existing_user(client, db_session):
+    """Test that verifying a mixed-case magic link reuses the existing lowercase user"""
+    user = User(email="mixed@example.com")
+    db_session.add(user)
+    db_session.commit()
+    
+    token = create_magic_link_token("Mixed@Example.COM")
+    response = client.get(f"/api/auth/verify?token={token}")
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["email"] == "mixed@example.com"
+    assert data["user_id"] == str(user.id)
+    
+    # No second row for the mixed-case spelling
+    user_count = db_session.query(User).filter(User.email.ilike("mixed@example.com")).count()
+    assert user_count == 1
+
+
+def test_encode_token_matches_pyjwt():
+    """Test that the precomputed signer produces the same token as PyJWT"""
+    claims = {
+        "sub": "b8c1d2e3-0000-4000-8000-000000000001",
+        "email": "zoë@exämple.com",
+        "name": "Łukasz 日本",
+        "exp": 1893456000,
+        "type": "session"
+    }
+    
+    assert _encode_token(claims) == jwt.encode(claims, settings.secret_key, algorithm=settings.algorithm)
+
+
+def test_encode_token_round_trip():
+    """Test that tokens from the precomputed signer decode with PyJWT"""
+    claims = {
+        "sub": "roundtrip@example.com",
+        "email": "rené@example.com",
+        "exp": int(time.time()) + 900,
+        "type": "magic_link"
+    }
+    
+    token = _encode_token(claims)
+    
+    assert jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm]) == claims
+
+
+@pytest.fixture
+def count_decodes(monkeypatch):
+    """Count how many times verify_token falls through to jwt.decode"""
+    calls = []
+    real_decode = jwt.decode
+    
+    def decode(*args, **kwargs):
+        calls.append(args[0])
+        return real_decode(*args, **kwargs)
+    
+    monkeypatch.setattr(auth.jwt, "decode", decode)
+    return calls
+
+
+async def test_cached_token_rejected_after_expiry():
+    """Test that a cached payload is not served once its exp has passed"""
+    claims = {"sub": "cache-expired@example.com", "exp": int(time.time()) - 1, "type": "session"}
+    token = _encode_token(claims)
+    
+    # As if the token had been verified and cached while still valid
+    auth._TOKEN_CACHE[(token, "session")] = claims
+    
+    with pytest.raises(HTTPException) as exc_info:
+        await verify_token(token, "session")
+    
+    assert exc_info.value.status_code == 401
+    assert "expired" in exc_info.value.detail.lower()
+
+
+async def test_cached_magic_link_rejected_as_session():
+    """Test that caching a magic link token doesn't let it pass as a session token"""
+    token = _encode_token(
+        {"sub": "cache-type@example.com", "exp": int(time.time()) + 900, "type": "magic_link"}
+    )
+    
+    await verify_token(token, "magic_link")
+    
+    with pytest.raises(HTTPException) as exc_info:
+        await verify_token(token, "session")
+    
+    assert exc_info.value.status_code == 401
+    assert exc_info.value.detail == "Invalid token type"
+
+
+async def test_drop_cached_token_forces_decode(count_decodes):
+    """Test that an evicted token is decoded again on the next verification"""
+    token = _encode_token(
+        {"sub": "cache-drop@example.com", "exp": int(time.time()) + 900, "type": "session"}
+    )
+    
+    await verify_token(token, "session")
+    await verify_token(token, "session")
+    assert len(count_decodes) == 1
+    
+    drop_cached_token(token)
+    await verify_token(token, "session")
+    assert len(count_decodes) == 2
@@ -4,98 +4,129 @@ Integration tests for insight generation
 import pytest
 from datetime import datetime, timedelta
 from decimal import Decimal
-from jose import jwt
+from sqlalchemy import insert
 
-from api.config import settings
 from api.models import User, Store, Receipt, LineItem, PriceHistory, ParseStatus
 
+# Words that should NOT appear in insights
+_FORBIDDEN = frozenset(("will", "predict", "forecast", "expect", "should", "recommend"))
 
-@pytest.fixture
-def user_with_receipts(db_session):
-    """Create a user with multiple receipts for insight generation"""
+# Per-receipt prices for the seeded products, one entry per receipt
+_BANANA = tuple(Decimal("1.99") + Decimal(i) * Decimal("0.10") for i in range(6))
+_ALMOND = tuple(Decimal("3.49") + Decimal(i) * Decimal("0.15") for i in range(6))
+
+
+@pytest.fixture(scope="module")
+def insights_seed(committed_session, make_session_token):
+    """
+    Create a user with multiple receipts for insight generation.
+
+    Seeded and committed once per module; the insight tests only read it.
+    """
+    # Create the user and stores with a single flush to assign their ids
     user = User(email="insightuser@example.com")
-    db_session.add(user)
-    db_session.commit()
-    
-    # Create stores
     store1 = Store(name="Whole Foods", normalized_name="whole foods")
     store2 = Store(name="Trader Joe's", normalized_name="trader joes")
-    db_session.add_all([store1, store2])
-    db_session.commit()
+    committed_session.add_all([user, store1, store2])
+    committed_session.flush()
     
-    # Create receipts with line items
+    # Create receipts, line items and price history with one bulk INSERT each
     base_date = datetime.now() - timedelta(days=60)
+    dates = [(base_date + timedelta(days=i * 10)).date() for i in range(6)]
     
+    receipt_rows = []
     for i in range(6):
         store = store1 if i % 2 == 0 else store2
-        purchase_date = base_date + timedelta(days=i * 10)
-        
-        receipt = Receipt(
-            user_id=user.id,
-            store_id=store.id,
-            original_file_path=f"test/receipt_{i}.txt",
-            parse_status=ParseStatus.SUCCESS,
-            purchase_date=purchase_date.date(),
-            total_amount=Decimal("20.00")
-        )
-        db_session.add(receipt)
-        db_session.flush()
-        
-        # Add line items
+        receipt_rows.append({
+            "user_id": user.id,
+            "store_id": store.id,
+            "original_file_path": f"test/receipt_{i}.txt",
+            "parse_status": ParseStatus.SUCCESS,
+            "purchase_date": dates[i],
+            "total_amount": Decimal("20.00")
+        })
+    receipt_ids = committed_session.execute(
+        insert(Receipt).returning(Receipt.id, sort_by_parameter_order=True),
+        receipt_rows
+    ).scalars().all()
+    
+    line_item_rows = []
+    price_history_rows = []
+    for i, (receipt_row, receipt_id) in enumerate(zip(receipt_rows, receipt_ids)):
         products = [
-            ("Organic Bananas", Decimal("1.99") + Decimal(str(i * 0.10))),
-            ("Almond Milk", Decimal("3.49") + Decimal(str(i * 0.15))),
+            ("Organic Bananas", _BANANA[i]),
+            ("Almond Milk", _ALMOND[i]),
             ("Greek Yogurt", Decimal("1.29"))
         ]
         
         for idx, (product_name, price) in enumerate(products):
-            line_item = LineItem(
-                receipt_id=receipt.id,
-                product_name=product_name,
-                normalized_product_name=product_name.lower(),
-                total_price=price,
-                line_number=idx + 1
-            )
-            db_session.add(line_item)
-            db_session.flush()
-            
-            # Create price history
-            price_history = PriceHistory(
-                product_name=product_name.lower(),
-                store_id=store.id,
-                price=price,
-                observed_date=purchase_date.date(),
-                source_line_item_id=line_item.id
-            )
-            db_session.add(price_history)
-    
-    db_session.commit()
+            line_item_rows.append({
+                "receipt_id": receipt_id,
+                "product_name": product_name,
+                "normalized_product_name": product_name.lower(),
+                "total_price": price,
+                "line_number": idx + 1
+            })
+            price_history_rows.append({
+                "product_name": product_name.lower(),
+                "store_id": receipt_row["store_id"],
+                "price": price,
+                "observed_date": receipt_row["purchase_date"]
+            })
+    line_item_ids = committed_session.execute(
+        insert(LineItem).returning(LineItem.id, sort_by_parameter_order=True),
+        line_item_rows
+    ).scalars().all()
+    
+    for price_history_row, line_item_id in zip(price_history_rows, line_item_ids):
+        price_history_row["source_line_item_id"] = line_item_id
+    committed_session.execute(insert(PriceHistory), price_history_rows)
+    
+    committed_session.commit()
     
     # Create session token
-    expire = datetime.utcnow() + timedelta(days=30)
-    token = jwt.encode(
-        {"sub": str(user.id), "email": user.email, "exp": expire, "type": "session"},
-        settings.secret_key,
-        algorithm=settings.algorithm
-    )
+    auth = make_session_token(user.id, user.email)
     
-    return {"user": user, "token": token}
+    return {"user": user, "auth": auth}
 
 
-def test_insights_with_sufficient_data(client, user_with_receipts):
-    """Test that insights are generated when sufficient data exists"""
-    response = client.get(
+@pytest.fixture(scope="module")
+def empty_user_auth(committed_session, make_session_token):
+    """Session auth for a committed user with no receipts, shared by the negative-path tests"""
+    user = User(email="emptyuser@example.com")
+    committed_session.add(user)
+    committed_session.commit()
+    
+    return make_session_token(user.id, user.email)
+
+
+@pytest.fixture(scope="module")
+def insights_response(app_client, insights_seed):
+    """Fetch the seeded user's insights once and share the parsed JSON"""
+    response = app_client.get(
         "/api/insights",
-        headers={"Authorization": f"Bearer {user_with_receipts['token']}"}
+        headers=insights_seed["auth"].headers
     )
-    
     assert response.status_code == 200
-    data = response.json()
-    assert "insights" in data
-    assert len(data["insights"]) > 0
+    return response.json()
+
+
+@pytest.fixture(scope="module")
+def insights_by_type(insights_response):
+    """Group the shared insights by type once"""
+    grouped = {}
+    for insight in insights_response["insights"]:
+        grouped.setdefault(insight["type"], []).append(insight)
+    return grouped
+
+
+def test_insights_with_sufficient_data(insights_response):
+    """Test that insights are generated when sufficient data exists"""
+    assert "insights" in insights_response
+    assert len(insights_response["insights"]) > 0
     
     # Verify insight structure
-    for insight in data["insights"]:
+    for insight in insights_response["insights"]:
         assert "type" in insight
         assert "title" in insight
         assert "description" in insight
@@ -105,23 +136,11 @@ def test_insights_with_sufficient_data(client, user_with_receipts):
         assert "generated_at" in insight
 
 
-def test_insights_without_data(client, db_session):
+def test_insights_without_data(client, empty_user_auth):
     """Test that appropriate message is shown when insufficient data"""
-    # Create user with no receipts
-    user = User(email="newuser@example.com")
-    db_session.add(user)
-    db_session.commit()
-    
-    expire = datetime.utcnow() + timedelta(days=30)
-    token = jwt.encode(
-        {"sub": str(user.id), "email": user.email, "exp": expire, "type": "session"},
-        settings.secret_key,
-        algorithm=settings.algorithm
-    )
-    
     response = client.get(
         "/api/insights",
-        headers={"Authorization": f"Bearer {token}"}
+        headers=empty_user_auth.headers
     )
     
     assert response.status_code == 200
@@ -130,83 +149,28 @@ def test_insights_without_data(client, db_session):
     assert "more receipts" in data["message"].lower()
 
 
-def test_purchase_frequency_insight(client, user_with_receipts):
-    """Test that purchase frequency insights are generated"""
-    response = client.get(
-        "/api/insights",
-        headers={"Authorization": f"Bearer {user_with_receipts['token']}"}
-    )
-    
-    data = response.json()
-    frequency_insights = [i for i in data["insights"] if i["type"] == "purchase_frequency"]
+@pytest.mark.parametrize("insight_type,min_points", [
+    ("purchase_frequency", 3),
+    ("price_trend", 2),
+    ("common_purchase", 3),
+    ("store_pattern", 5),
+])
+def test_insight_type(insights_by_type, insight_type, min_points):
+    """Test that each insight type is generated above its minimum threshold"""
+    typed_insights = insights_by_type.get(insight_type, [])
     
-    assert len(frequency_insights) > 0
-    insight = frequency_insights[0]
-    assert insight["data_points"] >= 3  # Minimum threshold
-
-
-def test_price_trend_insight(client, user_with_receipts):
-    """Test that price trend insights are generated"""
-    response = client.get(
-        "/api/insights",
-        headers={"Authorization": f"Bearer {user_with_receipts['token']}"}
-    )
-    
-    data = response.json()
-    trend_insights = [i for i in data["insights"] if i["type"] == "price_trend"]
-    
-    assert len(trend_insights) > 0
-    insight = trend_insights[0]
-    assert insight["data_points"] >= 2  # Minimum threshold
+    assert len(typed_insights) > 0
+    insight = typed_insights[0]
+    assert insight["data_points"] >= min_points
     assert len(insight["underlying_data"]) > 0
 
 
-def test_common_purchase_insight(client, user_with_receipts):
-    """Test that common purchase insights are generated"""
-    response = client.get(
-        "/api/insights",
-        headers={"Authorization": f"Bearer {user_with_receipts['token']}"}
-    )
-    
-    data = response.json()
-    common_insights = [i for i in data["insights"] if i["type"] == "common_purchase"]
-    
-    assert len(common_insights) > 0
-    insight = common_insights[0]
-    assert insight["data_points"] >= 3  # Minimum threshold
-
-
-def test_store_pattern_insight(client, user_with_receipts):
-    """Test that store pattern insights are generated"""
-    response = client.get(
-        "/api/insights",
-        headers={"Authorization": f"Bearer {user_with_receipts['token']}"}
-    )
-    
-    data = response.json()
-    pattern_insights = [i for i in data["insights"] if i["type"] == "store_pattern"]
-    
-    assert len(pattern_insights) > 0
-    insight = pattern_insights[0]
-    assert insight["data_points"] >= 5  # Minimum threshold
-
-
-def test_insights_no_predictive_language(client, user_with_receipts):
+def test_insights_no_predictive_language(insights_response):
     """Test that insights contain no predictive language"""
-    response = client.get(
-        "/api/insights",
-        headers={"Authorization": f"Bearer {user_with_receipts['token']}"}
-    )
-    
-    data = response.json()
-    
-    # Words that should NOT appear in insights
-    forbidden_words = ["will", "predict", "forecast", "expect", "should", "recommend"]
-    
-    for insight in data["insights"]:
-        description_lower = insight["description"].lower()
-        for word in forbidden_words:
-            assert word not in description_lower, f"Found predictive word '{word}' in insight"
+    for insight in insights_response["insights"]:
+        description = insight["description"].lower()
+        found = next((word for word in _FORBIDDEN if word in description), None)
+        assert found is None, f"Found predictive word {found!r} in insight"
 
 
 def test_insights_require_authentication(client):
@@ -216,43 +180,33 @@ def test_insights_require_authentication(client):
     assert response.status_code == 400  # Missing required header
 
 
-def test_insights_user_isolation(client, db_session):
+def test_insights_user_isolation(client, db_session, empty_user_auth):
     """Test that users only see insights from their own data"""
-    # Create two users with different data
+    # Give user1 enough data for insights; the empty user has none
     user1 = User(email="user1@example.com")
-    user2 = User(email="user2@example.com")
-    db_session.add_all([user1, user2])
-    db_session.commit()
-    
     store = Store(name="Test Store", normalized_name="test store")
-    db_session.add(store)
-    db_session.commit()
+    db_session.add_all([user1, store])
+    db_session.flush()
     
     # Create receipts only for user1
-    for i in range(6):
-        receipt = Receipt(
-            user_id=user1.id,
-            store_id=store.id,
-            original_file_path=f"user1/receipt_{i}.txt",
-            parse_status=ParseStatus.SUCCESS,
-            purchase_date=datetime.now().date()
-        )
-        db_session.add(receipt)
+    purchase_date = datetime.now().date()
+    db_session.execute(insert(Receipt), [
+        {
+            "user_id": user1.id,
+            "store_id": store.id,
+            "original_file_path": f"user1/receipt_{i}.txt",
+            "parse_status": ParseStatus.SUCCESS,
+            "purchase_date": purchase_date
+        }
+        for i in range(6)
+    ])
     
     db_session.commit()
     
-    # Create token for user2
-    expire = datetime.utcnow() + timedelta(days=30)
-    token2 = jwt.encode(
-        {"sub": str(user2.id), "email": user2.email, "exp": expire, "type": "session"},
-        settings.secret_key,
-        algorithm=settings.algorithm
-    )
-    
-    # User2 should have no insights
+    # The empty user should have no insights
     response = client.get(
         "/api/insights",
-        headers={"Authorization": f"Bearer {token2}"}
+        headers=empty_user_auth.headers
     )
     
     assert response.status_code == 200
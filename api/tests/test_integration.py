@@ -4,10 +4,24 @@ End-to-end integration tests for complete workflows
 import pytest
 import io
 from datetime import datetime, timedelta
-from jose import jwt
+from sqlalchemy import insert
 
-from api.config import settings
 from api.models import User
+from api.auth import create_magic_link_token
+from api.config import settings
+
+# These tests drive the real parser end to end
+pytestmark = pytest.mark.integration
+
+# Receipt uploaded by the workflow tests, encoded once
+SAMPLE_RECEIPT = """Whole Foods Market
+Date: 01/15/2024
+
+Organic Bananas    1.99
+Almond Milk        3.49
+
+Total: 5.48"""
+_RECEIPT_BYTES = SAMPLE_RECEIPT.encode()
 
 
 def test_complete_auth_flow(client, db_session):
@@ -22,12 +36,7 @@ def test_complete_auth_flow(client, db_session):
     assert response.status_code == 200
     
     # Step 2: Create and verify magic link token
-    expire = datetime.utcnow() + timedelta(seconds=900)
-    magic_token = jwt.encode(
-        {"sub": email, "exp": expire, "type": "magic_link"},
-        settings.secret_key,
-        algorithm=settings.algorithm
-    )
+    magic_token = create_magic_link_token(email)
     
     response = client.get(f"/api/auth/verify?token={magic_token}")
     assert response.status_code == 200
@@ -42,43 +51,32 @@ def test_complete_auth_flow(client, db_session):
     assert response.status_code == 200
 
 
-def test_complete_receipt_workflow(client, db_session):
+@pytest.mark.asyncio(scope="session")
+async def test_complete_receipt_workflow(aclient, db_session, make_session_token, monkeypatch, tmp_path):
     """Test complete receipt workflow: upload → parse → retrieve details"""
+    # Keep the uploaded file out of the real upload directory
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    
     # Create user and token
     user = User(email="receiptflow@example.com")
     db_session.add(user)
     db_session.commit()
     
-    expire = datetime.utcnow() + timedelta(days=30)
-    token = jwt.encode(
-        {"sub": str(user.id), "email": user.email, "exp": expire, "type": "session"},
-        settings.secret_key,
-        algorithm=settings.algorithm
-    )
+    auth = make_session_token(user.id, user.email)
     
     # Step 1: Upload receipt
-    receipt_content = """Whole Foods Market
-Date: 01/15/2024
-
-Organic Bananas    1.99
-Almond Milk        3.49
-
-Total: 5.48"""
-    
-    file_data = io.BytesIO(receipt_content.encode())
-    
-    response = client.post(
+    response = await aclient.post(
         "/api/receipts/upload",
-        headers={"Authorization": f"Bearer {token}"},
-        files={"file": ("receipt.txt", file_data, "text/plain")}
+        headers=auth.headers,
+        files={"file": ("receipt.txt", io.BytesIO(_RECEIPT_BYTES), "text/plain")}
     )
     assert response.status_code == 200
     receipt_id = response.json()["receipt_id"]
     
     # Step 2: List receipts
-    response = client.get(
+    response = await aclient.get(
         "/api/receipts",
-        headers={"Authorization": f"Bearer {token}"}
+        headers=auth.headers
     )
     assert response.status_code == 200
     receipts = response.json()["receipts"]
@@ -86,9 +84,9 @@ Total: 5.48"""
     assert receipts[0]["receipt_id"] == receipt_id
     
     # Step 3: Get receipt details
-    response = client.get(
+    response = await aclient.get(
         f"/api/receipts/{receipt_id}",
-        headers={"Authorization": f"Bearer {token}"}
+        headers=auth.headers
     )
     assert response.status_code == 200
     details = response.json()
@@ -96,79 +94,77 @@ Total: 5.48"""
     assert "line_items" in details
 
 
-def test_complete_insights_workflow(client, db_session):
+@pytest.mark.asyncio(scope="session")
+async def test_complete_insights_workflow(aclient, db_session, make_session_token):
     """Test complete insights workflow: upload multiple receipts → generate insights"""
     from api.models import Store, Receipt, LineItem, PriceHistory, ParseStatus
     from decimal import Decimal
     
-    # Create user
+    # Create user and store
     user = User(email="insightflow@example.com")
-    db_session.add(user)
-    db_session.commit()
-    
-    expire = datetime.utcnow() + timedelta(days=30)
-    token = jwt.encode(
-        {"sub": str(user.id), "email": user.email, "exp": expire, "type": "session"},
-        settings.secret_key,
-        algorithm=settings.algorithm
-    )
-    
-    # Create store
     store = Store(name="Test Store", normalized_name="test store")
-    db_session.add(store)
-    db_session.commit()
+    db_session.add_all([user, store])
+    db_session.flush()
     
-    # Create multiple receipts with line items
+    auth = make_session_token(user.id, user.email)
+    
+    # Create receipts, line items and price history with one bulk INSERT each
     base_date = datetime.now() - timedelta(days=30)
+    dates = [(base_date + timedelta(days=i * 5)).date() for i in range(6)]
     
+    receipt_rows = []
     for i in range(6):
-        purchase_date = base_date + timedelta(days=i * 5)
-        
-        receipt = Receipt(
-            user_id=user.id,
-            store_id=store.id,
-            original_file_path=f"test/receipt_{i}.txt",
-            parse_status=ParseStatus.SUCCESS,
-            purchase_date=purchase_date.date(),
-            total_amount=Decimal("15.00")
-        )
-        db_session.add(receipt)
-        db_session.flush()
-        
-        # Add line items
-        products = [
-            ("Bananas", Decimal("1.99")),
-            ("Milk", Decimal("3.49")),
-            ("Bread", Decimal("2.99"))
-        ]
-        
+        receipt_rows.append({
+            "user_id": user.id,
+            "store_id": store.id,
+            "original_file_path": f"test/receipt_{i}.txt",
+            "parse_status": ParseStatus.SUCCESS,
+            "purchase_date": dates[i],
+            "total_amount": Decimal("15.00")
+        })
+    receipt_ids = db_session.execute(
+        insert(Receipt).returning(Receipt.id, sort_by_parameter_order=True),
+        receipt_rows
+    ).scalars().all()
+    
+    products = [
+        ("Bananas", Decimal("1.99")),
+        ("Milk", Decimal("3.49")),
+        ("Bread", Decimal("2.99"))
+    ]
+    
+    line_item_rows = []
+    price_history_rows = []
+    for receipt_row, receipt_id in zip(receipt_rows, receipt_ids):
         for idx, (product_name, price) in enumerate(products):
-            line_item = LineItem(
-                receipt_id=receipt.id,
-                product_name=product_name,
-                normalized_product_name=product_name.lower(),
-                total_price=price,
-                line_number=idx + 1
-            )
-            db_session.add(line_item)
-            db_session.flush()
-            
-            # Create price history
-            price_history = PriceHistory(
-                product_name=product_name.lower(),
-                store_id=store.id,
-                price=price,
-                observed_date=purchase_date.date(),
-                source_line_item_id=line_item.id
-            )
-            db_session.add(price_history)
+            line_item_rows.append({
+                "receipt_id": receipt_id,
+                "product_name": product_name,
+                "normalized_product_name": product_name.lower(),
+                "total_price": price,
+                "line_number": idx + 1
+            })
+            price_history_rows.append({
+                "product_name": product_name.lower(),
+                "store_id": store.id,
+                "price": price,
+                "observed_date": receipt_row["purchase_date"]
+            })
+    line_item_ids = db_session.execute(
+        insert(LineItem).returning(LineItem.id, sort_by_parameter_order=True),
+        line_item_rows
+    ).scalars().all()
+    
+    for price_history_row, line_item_id in zip(price_history_rows, line_item_ids):
+        price_history_row["source_line_item_id"] = line_item_id
+    db_session.execute(insert(PriceHistory), price_history_rows)
     
     db_session.commit()
     
     # Generate insights
-    response = client.get(
+    response = await aclient.get(
         "/api/insights",
-        headers={"Authorization": f"Bearer {token}"}
+        headers=auth.headers
     )
     assert response.status_code == 200
     data = response.json()
@@ -180,68 +176,56 @@ def test_complete_insights_workflow(client, db_session):
     assert "common_purchase" in insight_types
 
 
-def test_multi_user_isolation(client, db_session):
+@pytest.mark.asyncio(scope="session")
+async def test_multi_user_isolation(aclient, db_session, make_session_token):
     """Test that multiple users' data remains isolated"""
     from api.models import Store, Receipt, ParseStatus
     
-    # Create two users
+    # Create two users and a shared store
     user1 = User(email="user1@isolation.com")
     user2 = User(email="user2@isolation.com")
-    db_session.add_all([user1, user2])
-    db_session.commit()
-    
-    # Create tokens
-    expire = datetime.utcnow() + timedelta(days=30)
-    token1 = jwt.encode(
-        {"sub": str(user1.id), "email": user1.email, "exp": expire, "type": "session"},
-        settings.secret_key,
-        algorithm=settings.algorithm
-    )
-    token2 = jwt.encode(
-        {"sub": str(user2.id), "email": user2.email, "exp": expire, "type": "session"},
-        settings.secret_key,
-        algorithm=settings.algorithm
-    )
-    
-    # Create store
     store = Store(name="Test Store", normalized_name="test store")
-    db_session.add(store)
-    db_session.commit()
+    db_session.add_all([user1, user2, store])
+    db_session.flush()
     
-    # Create receipts for user1
-    for i in range(3):
-        receipt = Receipt(
-            user_id=user1.id,
-            store_id=store.id,
-            original_file_path=f"user1/receipt_{i}.txt",
-            parse_status=ParseStatus.SUCCESS
-        )
-        db_session.add(receipt)
-    
-    # Create receipts for user2
-    for i in range(2):
-        receipt = Receipt(
-            user_id=user2.id,
-            store_id=store.id,
-            original_file_path=f"user2/receipt_{i}.txt",
-            parse_status=ParseStatus.SUCCESS
-        )
-        db_session.add(receipt)
+    # Create tokens
+    auth1 = make_session_token(user1.id, user1.email)
+    auth2 = make_session_token(user2.id, user2.email)
+    
+    # Create receipts for both users in a single INSERT
+    receipt_rows = [
+        {
+            "user_id": user1.id,
+            "store_id": store.id,
+            "original_file_path": f"user1/receipt_{i}.txt",
+            "parse_status": ParseStatus.SUCCESS
+        }
+        for i in range(3)
+    ] + [
+        {
+            "user_id": user2.id,
+            "store_id": store.id,
+            "original_file_path": f"user2/receipt_{i}.txt",
+            "parse_status": ParseStatus.SUCCESS
+        }
+        for i in range(2)
+    ]
+    db_session.execute(insert(Receipt), receipt_rows)
     
     db_session.commit()
     
     # User1 should see only their receipts
-    response = client.get(
+    response = await aclient.get(
         "/api/receipts",
-        headers={"Authorization": f"Bearer {token1}"}
+        headers=auth1.headers
     )
     assert response.status_code == 200
     assert response.json()["total"] == 3
     
     # User2 should see only their receipts
-    response = client.get(
+    response = await aclient.get(
         "/api/receipts",
-        headers={"Authorization": f"Bearer {token2}"}
+        headers=auth2.headers
     )
     assert response.status_code == 200
     assert response.json()["total"] == 2
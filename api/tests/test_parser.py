@@ -2,6 +2,12 @@
 Test script for enhanced receipt parser
 """
 import sys
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
 sys.path.insert(0, './api')
 
 from api.parser import (
@@ -12,6 +18,10 @@ from api.parser import (
     extract_tax,
     assess_parsing_confidence
 )
+from api.models import ParseStatus
+
+# Keep the parser tests on one xdist worker (run with --dist loadgroup)
+pytestmark = pytest.mark.xdist_group("parser")
 
 # Sample receipt text
 SAMPLE_RECEIPT = """
@@ -36,71 +46,79 @@ Total                    34.00
 Thank you for shopping!
 """
 
-def test_store_extraction():
-    print("Testing store extraction...")
-    store_name, confidence = extract_store_name(SAMPLE_RECEIPT)
-    print(f"  Store: {store_name}")
-    print(f"  Confidence: {confidence:.2f}")
-    assert store_name is not None
+def _parse_sample():
+    """Run every extractor over SAMPLE_RECEIPT once"""
+    return SimpleNamespace(
+        store=extract_store_name(SAMPLE_RECEIPT),
+        date=extract_date(SAMPLE_RECEIPT),
+        items=extract_line_items(SAMPLE_RECEIPT),
+        total=extract_total(SAMPLE_RECEIPT),
+        tax=extract_tax(SAMPLE_RECEIPT)
+    )
+
+@pytest.fixture(scope="module")
+def parsed():
+    """Parse the sample receipt once for the whole module"""
+    return _parse_sample()
+
+def _assess(parsed):
+    return assess_parsing_confidence(
+        parsed.store[0], parsed.store[1],
+        parsed.date[0], parsed.date[1],
+        parsed.items[0], parsed.items[1],
+        parsed.total[0], parsed.total[1],
+        parsed.tax
+    )
+
+def test_store_extraction(parsed):
+    store_name, confidence = parsed.store
+    assert store_name == "whole foods market"
     assert confidence > 0.8
-    print("  ✓ PASSED\n")
-
-def test_date_extraction():
-    print("Testing date extraction...")
-    date, confidence = extract_date(SAMPLE_RECEIPT)
-    print(f"  Date: {date}")
-    print(f"  Confidence: {confidence:.2f}")
-    assert date is not None
+
+def test_date_extraction(parsed):
+    date, confidence = parsed.date
+    assert date == datetime(2026, 1, 8)
     assert confidence > 0.8
-    print("  ✓ PASSED\n")
 
-def test_line_items_extraction():
-    print("Testing line items extraction...")
-    items, metadata = extract_line_items(SAMPLE_RECEIPT)
-    print(f"  Items extracted: {len(items)}")
-    print(f"  Extraction rate: {metadata['matched_lines']}/{metadata['processed_lines']}")
-    for product, quantity, price in items[:3]:
-        print(f"    - {product} {quantity or ''} ${price}")
-    assert len(items) >= 5
-    print("  ✓ PASSED\n")
-
-def test_total_extraction():
-    print("Testing total extraction...")
-    total, confidence = extract_total(SAMPLE_RECEIPT)
-    print(f"  Total: ${total}")
-    print(f"  Confidence: {confidence:.2f}")
+def test_line_items_extraction(parsed):
+    items, metadata = parsed.items
+    assert len(items) == 6
+    assert items[0] == ("Organic Bananas", "2.5 lb", Decimal("3.75"))
+    assert items[1] == ("Almond Milk", None, Decimal("4.99"))
+    assert metadata["matched_lines"] == len(items)
+
+def test_total_extraction(parsed):
+    total, confidence = parsed.total
     assert total is not None
     assert confidence > 0.8
-    print("  ✓ PASSED\n")
-
-def test_tax_extraction():
-    print("Testing tax extraction...")
-    tax = extract_tax(SAMPLE_RECEIPT)
-    print(f"  Tax: ${tax}")
-    assert tax is not None
-    print("  ✓ PASSED\n")
-
-def test_confidence_assessment():
-    print("Testing confidence assessment...")
-    store_name, store_conf = extract_store_name(SAMPLE_RECEIPT)
-    date, date_conf = extract_date(SAMPLE_RECEIPT)
-    items, items_meta = extract_line_items(SAMPLE_RECEIPT)
-    total, total_conf = extract_total(SAMPLE_RECEIPT)
-    tax = extract_tax(SAMPLE_RECEIPT)
-    
-    status, error, details = assess_parsing_confidence(
-        store_name, store_conf,
-        date, date_conf,
-        items, items_meta,
-        total, total_conf,
-        tax
-    )
-    
-    print(f"  Status: {status.value}")
-    print(f"  Overall confidence: {details['overall_confidence']:.2f}")
-    print(f"  Issues: {details['issues']}")
+
+def test_tax_extraction(parsed):
+    assert parsed.tax == Decimal("2.52")
+
+def test_confidence_assessment(parsed):
+    status, error, details = _assess(parsed)
+    assert status == ParseStatus.SUCCESS
     assert details['overall_confidence'] > 0.7
-    print("  ✓ PASSED\n")
+
+def _report(parsed):
+    """Print what the extractors found, for running this file directly"""
+    store_name, store_conf = parsed.store
+    print(f"Store: {store_name} (confidence {store_conf:.2f})")
+    date, date_conf = parsed.date
+    print(f"Date: {date} (confidence {date_conf:.2f})")
+    items, metadata = parsed.items
+    print(f"Items extracted: {len(items)}")
+    print(f"Extraction rate: {metadata['matched_lines']}/{metadata['processed_lines']}")
+    for product, quantity, price in items[:3]:
+        print(f"  - {product} {quantity or ''} ${price}")
+    total, total_conf = parsed.total
+    print(f"Total: ${total} (confidence {total_conf:.2f})")
+    print(f"Tax: ${parsed.tax}")
+    status, error, details = _assess(parsed)
+    print(f"Status: {status.value}")
+    print(f"Overall confidence: {details['overall_confidence']:.2f}")
+    print(f"Issues: {details['issues']}")
+    print()
 
 if __name__ == "__main__":
     print("=" * 60)
@@ -108,12 +126,14 @@ if __name__ == "__main__":
     print("=" * 60 + "\n")
     
     try:
-        test_store_extraction()
-        test_date_extraction()
-        test_line_items_extraction()
-        test_total_extraction()
-        test_tax_extraction()
-        test_confidence_assessment()
+        sample = _parse_sample()
+        _report(sample)
+        test_store_extraction(sample)
+        test_date_extraction(sample)
+        test_line_items_extraction(sample)
+        test_total_extraction(sample)
+        test_tax_extraction(sample)
+        test_confidence_assessment(sample)
         
         print("=" * 60)
         print("All tests passed! ✓")
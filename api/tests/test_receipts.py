@@ -3,34 +3,50 @@ Integration tests for receipt endpoints
 """
 import pytest
 import io
-from datetime import datetime, timedelta
-from jose import jwt
+import uuid
+from datetime import date
 from pathlib import Path
+from sqlalchemy import event, insert
 
 from api.config import settings
 from api.models import User, Receipt, Store, LineItem, ParseStatus
 
 
-@pytest.fixture
-def authenticated_user(db_session):
-    """Create a test user and return user with session token"""
+@pytest.fixture(autouse=True)
+def _stub_parser(monkeypatch, tmp_path):
+    """
+    Skip OCR and text extraction on upload; the endpoint is what's under test.
+
+    Uploaded files land in the test's temporary directory.
+    """
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    
+    def parse_receipt(receipt, db, file_base_path="./uploads"):
+        receipt.parse_status = ParseStatus.SUCCESS
+        db.commit()
+    
+    monkeypatch.setattr("api.receipts.parse_receipt", parse_receipt)
+
+
+@pytest.fixture(scope="module")
+def authenticated_user(committed_session, make_session_token):
+    """
+    Create a test user and return user with session token.
+
+    Committed once per module; rows tests attach to the user roll back with
+    their db_session.
+    """
     user = User(email="testuser@example.com")
-    db_session.add(user)
-    db_session.commit()
-    db_session.refresh(user)
+    committed_session.add(user)
+    committed_session.commit()
     
     # Create session token
-    expire = datetime.utcnow() + timedelta(days=30)
-    token = jwt.encode(
-        {"sub": str(user.id), "email": user.email, "exp": expire, "type": "session"},
-        settings.secret_key,
-        algorithm=settings.algorithm
-    )
+    auth = make_session_token(user.id, user.email)
     
-    return {"user": user, "token": token}
+    return {"user": user, "auth": auth}
 
 
-def test_upload_receipt_text_file(client, authenticated_user, tmp_path):
+def test_upload_receipt_text_file(client, authenticated_user, db_session, tmp_path):
     """Test uploading a text receipt file"""
     # Create test receipt content
     receipt_content = """Whole Foods Market
@@ -48,14 +64,22 @@ Total: 9.77"""
     
     response = client.post(
         "/api/receipts/upload",
-        headers={"Authorization": f"Bearer {authenticated_user['token']}"},
+        headers=authenticated_user["auth"].headers,
         files={"file": ("receipt.txt", file_data, "text/plain")}
     )
     
     assert response.status_code == 200
     data = response.json()
     assert "receipt_id" in data
-    assert "status" in data
+    assert data["status"] == "success"
+    
+    # The upload is stored under the user's directory and recorded against them
+    receipt = db_session.get(Receipt, uuid.UUID(data["receipt_id"]))
+    assert receipt is not None
+    assert receipt.user_id == authenticated_user["user"].id
+    assert receipt.original_file_path.startswith(str(receipt.user_id))
+    assert receipt.original_file_path.endswith(".txt")
+    assert data["message"] == f"Receipt uploaded. Status: {receipt.parse_status.value}"
 
 
 def test_upload_invalid_file_format(client, authenticated_user):
@@ -64,7 +88,7 @@ def test_upload_invalid_file_format(client, authenticated_user):
     
     response = client.post(
         "/api/receipts/upload",
-        headers={"Authorization": f"Bearer {authenticated_user['token']}"},
+        headers=authenticated_user["auth"].headers,
         files={"file": ("receipt.doc", file_data, "application/msword")}
     )
     
@@ -88,7 +112,7 @@ def test_list_receipts_empty(client, authenticated_user):
     """Test listing receipts when user has none"""
     response = client.get(
         "/api/receipts",
-        headers={"Authorization": f"Bearer {authenticated_user['token']}"}
+        headers=authenticated_user["auth"].headers
     )
     
     assert response.status_code == 200
@@ -107,6 +131,7 @@ def test_list_receipts_with_data(client, authenticated_user, db_session):
     db_session.commit()
     
     # Create receipts
+    today = date.today()
     for i in range(3):
         receipt = Receipt(
             user_id=user.id,
@@ -114,7 +139,7 @@ def test_list_receipts_with_data(client, authenticated_user, db_session):
             original_file_path=f"test/receipt_{i}.txt",
             parse_status=ParseStatus.SUCCESS,
             total_amount=10.00 + i,
-            purchase_date=datetime.now().date()
+            purchase_date=today
         )
         db_session.add(receipt)
     
@@ -122,7 +147,7 @@ def test_list_receipts_with_data(client, authenticated_user, db_session):
     
     response = client.get(
         "/api/receipts",
-        headers={"Authorization": f"Bearer {authenticated_user['token']}"}
+        headers=authenticated_user["auth"].headers
     )
     
     assert response.status_code == 200
@@ -135,21 +160,22 @@ def test_list_receipts_pagination(client, authenticated_user, db_session):
     """Test receipt listing pagination"""
     user = authenticated_user["user"]
     
-    # Create 10 receipts
-    for i in range(10):
-        receipt = Receipt(
-            user_id=user.id,
-            original_file_path=f"test/receipt_{i}.txt",
-            parse_status=ParseStatus.SUCCESS
-        )
-        db_session.add(receipt)
+    # Create 10 receipts in one INSERT
+    db_session.execute(insert(Receipt), [
+        {
+            "user_id": user.id,
+            "original_file_path": f"test/receipt_{i}.txt",
+            "parse_status": ParseStatus.SUCCESS
+        }
+        for i in range(10)
+    ])
     
     db_session.commit()
     
     # Test first page
     response = client.get(
         "/api/receipts?limit=5&offset=0",
-        headers={"Authorization": f"Bearer {authenticated_user['token']}"}
+        headers=authenticated_user["auth"].headers
     )
     
     assert response.status_code == 200
@@ -162,7 +188,7 @@ def test_list_receipts_pagination(client, authenticated_user, db_session):
     # Test second page
     response = client.get(
         "/api/receipts?limit=5&offset=5",
-        headers={"Authorization": f"Bearer {authenticated_user['token']}"}
+        headers=authenticated_user["auth"].headers
     )
     
     assert response.status_code == 200
@@ -170,7 +196,7 @@ def test_list_receipts_pagination(client, authenticated_user, db_session):
     assert len(data["receipts"]) == 5
 
 
-def test_user_can_only_see_own_receipts(client, db_session):
+def test_user_can_only_see_own_receipts(client, db_session, make_session_token):
     """Test that users can only access their own receipts"""
     # Create two users
     user1 = User(email="user1@example.com")
@@ -188,17 +214,12 @@ def test_user_can_only_see_own_receipts(client, db_session):
     db_session.commit()
     
     # Create token for user2
-    expire = datetime.utcnow() + timedelta(days=30)
-    token2 = jwt.encode(
-        {"sub": str(user2.id), "email": user2.email, "exp": expire, "type": "session"},
-        settings.secret_key,
-        algorithm=settings.algorithm
-    )
+    auth2 = make_session_token(user2.id, user2.email)
     
     # User2 tries to access user1's receipt
     response = client.get(
         f"/api/receipts/{receipt1.id}",
-        headers={"Authorization": f"Bearer {token2}"}
+        headers=auth2.headers
     )
     
     assert response.status_code == 404
@@ -220,7 +241,7 @@ def test_get_receipt_detail(client, authenticated_user, db_session):
         original_file_path="test/receipt.txt",
         parse_status=ParseStatus.SUCCESS,
         total_amount=10.00,
-        purchase_date=datetime.now().date()
+        purchase_date=date.today()
     )
     db_session.add(receipt)
     db_session.commit()
@@ -238,7 +259,7 @@ def test_get_receipt_detail(client, authenticated_user, db_session):
     
     response = client.get(
         f"/api/receipts/{receipt.id}",
-        headers={"Authorization": f"Bearer {authenticated_user['token']}"}
+        headers=authenticated_user["auth"].headers
     )
     
     assert response.status_code == 200
@@ -249,14 +270,72 @@ def test_get_receipt_detail(client, authenticated_user, db_session):
     assert data["line_items"][0]["product_name"] == "Test Product"
 
 
+def test_receipt_detail_issues_single_query(client, authenticated_user, db_session):
+    """Test that receipt details load the store and line items with the receipt"""
+    user = authenticated_user["user"]
+    
+    store = Store(name="Test Store", normalized_name="test store")
+    db_session.add(store)
+    db_session.flush()
+    
+    receipt = Receipt(
+        user_id=user.id,
+        store_id=store.id,
+        original_file_path="test/receipt.txt",
+        parse_status=ParseStatus.SUCCESS
+    )
+    db_session.add(receipt)
+    db_session.flush()
+    
+    db_session.execute(insert(LineItem), [
+        {
+            "receipt_id": receipt.id,
+            "product_name": f"Product {i}",
+            "normalized_product_name": f"product {i}",
+            "total_price": 1.00,
+            "line_number": i + 1
+        }
+        for i in range(3)
+    ])
+    
+    db_session.commit()
+    
+    # Expire everything so a lazy relationship would have to hit the database
+    receipt_id = receipt.id
+    db_session.expire_all()
+    
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    connection = db_session.connection()
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        response = client.get(
+            f"/api/receipts/{receipt_id}",
+            headers=authenticated_user["auth"].headers
+        )
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+    
+    assert response.status_code == 200
+    assert len(response.json()["line_items"]) == 3
+    
+    receipt_queries = [
+        statement for statement in statements
+        if "receipts" in statement or "stores" in statement or "line_items" in statement
+    ]
+    assert len(receipt_queries) == 1
+
+
 def test_get_nonexistent_receipt(client, authenticated_user):
     """Test getting a receipt that doesn't exist"""
-    import uuid
     fake_id = uuid.uuid4()
     
     response = client.get(
         f"/api/receipts/{fake_id}",
-        headers={"Authorization": f"Bearer {authenticated_user['token']}"}
+        headers=authenticated_user["auth"].headers
     )
     
     assert response.status_code == 404
@@ -18,7 +18,7 @@ echo "📦 Running backend tests..."
 echo "---------------------------"
 
 # Run pytest with coverage
-docker-compose exec -T api pytest -v --cov=api --cov-report=term-missing
+docker-compose exec -T -e HYPOTHESIS_PROFILE=ci api pytest -v --cov=api --cov-report=term-missing
 
 echo ""
 echo "✓ All tests passed!"